@@ -117,7 +117,13 @@ def get_vendors():
         if not database:
             return jsonify({"error": "Database not available"}), 500
         
-        vendors = database.get_all_vendors()
+        # Optional keyset paging: ?limit=N&before_id=<id of the last vendor seen>
+        limit = request.args.get('limit', type=int)
+        if limit is not None and limit <= 0:
+            return jsonify({"error": "limit must be a positive integer"}), 400
+        before_id = request.args.get('before_id') or None
+        
+        vendors = database.get_all_vendors(limit=limit, before_id=before_id)
         return jsonify(vendors)
     except Exception as e:
         return jsonify({"error": f"Failed to fetch vendors: {str(e)}"}), 500
@@ -1,112 +1,303 @@
 import openai
+import httpx
+import hashlib
 import json
+import os
 import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+# Use orjson for the request key and response parsing when available
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Attempts the OpenAI SDK makes on 429/5xx responses before giving up; it
+# backs off exponentially with jitter and honours Retry-After
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '5'))
+
+# Keep connections to the API open between documents; httpx otherwise closes
+# idle keep-alive connections after 5s and the next call pays a new TLS handshake
+OPENAI_HTTP_LIMITS = httpx.Limits(
+    max_connections=16,
+    max_keepalive_connections=8,
+    keepalive_expiry=60
+)
+
+# Bound the completion cache so long-running workers don't keep every
+# document's response forever
+AI_CACHE_SIZE = int(os.getenv('AI_CACHE_SIZE', '1000'))
+AI_CACHE_TTL = float(os.getenv('AI_CACHE_TTL', str(24 * 3600)))
+# Optional SQLite file behind the in-memory cache, shared by the gunicorn
+# workers and kept across restarts; unset keeps the cache in memory only
+AI_CACHE_PATH = os.getenv('AI_CACHE_PATH')
+AI_CACHE_DB_SIZE = int(os.getenv('AI_CACHE_DB_SIZE', '10000'))
+AI_CACHE_PRUNE_INTERVAL = 100  # writes between trims of the SQLite cache
+
+AI_MODEL = "gpt-4-turbo-preview"
+AI_TEMPERATURE = 0.1
+AI_MAX_TOKENS = 1500
+
+# Extraction prompts, built once at import; only the document text varies
+def _extraction_prompt(kind, fields):
+    """Build a prompt template listing fields to extract from a document"""
+    # Instructions first and the document last, so every call for a kind
+    # shares the same prompt prefix
+    lines = [f"Extract the following fields from the {kind} text below as a JSON object:"]
+    lines.extend(f"- {field}" for field in fields)
+    lines.extend(("", f"{kind.capitalize()} text:", "{document}"))
+    return "\n".join(lines)
+
+
+CONTRACT_SYSTEM_MESSAGE = (
+    "You are a contract analysis expert specializing in vendor identification and service "
+    "classification. Return only valid JSON."
+)
+CONTRACT_PROMPT_TEMPLATE = _extraction_prompt("contract", (
+    'vendor_name: the company PROVIDING the services, NOT the client; look for suffixes like '
+    'Inc, LLC, Corp, Ltd, Company (e.g. "Acme Technologies Inc")',
+    'business_type: the kind of services the vendor provides, judged from the contract '
+    '(e.g. "Technology Services", "Consulting Services", "Marketing Services")',
+    'service_description: 1-2 sentences on the services being provided',
+    'contract_number', 'start_date', 'end_date', 'payment_terms', 'total_value',
+    'billing_frequency',
+    'items: list of items/services with descriptions and prices',
+    'special_conditions',
+))
+
+INVOICE_SYSTEM_MESSAGE = (
+    "You are an invoice analysis expert. Extract information accurately and return only JSON."
+)
+INVOICE_PROMPT_TEMPLATE = _extraction_prompt("invoice", (
+    'vendor_name', 'invoice_number', 'invoice_date', 'due_date', 'total_amount', 'subtotal',
+    'tax_amount',
+    'items: list with description, quantity, unit_price, total',
+    'payment_terms',
+    'reference_contract_number: if mentioned',
+))
+
+ZERO_AMOUNT = Decimal('0')
+AMOUNT_TOLERANCE = Decimal('0.01')
+
+# Patterns for the regex fallback, compiled once rather than per document
+AMOUNT_PATTERN = re.compile(r'\$?[\d,]+\.?\d*')
+DATE_PATTERN = re.compile(r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}')
+INVOICE_NUMBER_PATTERN = re.compile(r'Invoice\s*#?\s*(\w+)', re.I)
+CONTRACT_NUMBER_PATTERN = re.compile(r'Contract\s*#?\s*(\w+)', re.I)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+PAGE_MARKER_PATTERN = re.compile(r'--- Page \d+ ---')
+WORD_PATTERN = re.compile(r'\w')
 
 class AIAnalyzer:
     def __init__(self, api_key):
-        self.client = openai.OpenAI(api_key=api_key)
+        self.client = openai.OpenAI(
+            api_key=api_key,
+            max_retries=OPENAI_MAX_RETRIES,
+            # The SDK's default client (timeouts, redirects) with a longer keep-alive
+            http_client=openai.DefaultHttpxClient(limits=OPENAI_HTTP_LIMITS)
+        )
+        # Raw completions keyed by request, so re-processing the same
+        # document doesn't pay for another OpenAI round trip
+        self._response_cache = OrderedDict()  # key -> (monotonic timestamp, raw response)
+        self._cache_lock = threading.Lock()
+        self._cache_db = self._open_cache_db(AI_CACHE_PATH) if AI_CACHE_PATH else None
+        self._cache_db_writes = 0
+    
+    def close(self):
+        """Close the OpenAI connection pool and the persistent cache"""
+        self.client.close()
+        with self._cache_lock:
+            if self._cache_db is not None:
+                self._cache_db.close()
+                self._cache_db = None
+    
+    def _open_cache_db(self, path):
+        """Open the persistent response cache, dropping expired rows"""
+        try:
+            db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS ai_response_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_ai_response_cache_created_at
+                ON ai_response_cache (created_at)
+            """)
+            self._prune_cache_db(db)
+            db.commit()
+            return db
+        except sqlite3.Error as e:
+            print(f"AI cache unavailable: {str(e)}")
+            return None
+    
+    def _cache_key(self, request):
+        """Hash the canonical JSON form of a completion request"""
+        # Re-scans of a document differ mostly in OCR spacing and line breaks,
+        # so key on the messages with whitespace runs collapsed. Case and
+        # punctuation are kept: "1,000" and "1.000" are different amounts.
+        request = dict(request, messages=[
+            dict(message, content=WHITESPACE_PATTERN.sub(' ', message['content']).strip())
+            for message in request['messages']
+        ])
+        if ORJSON_AVAILABLE:
+            blob = orjson.dumps(request, option=orjson.OPT_SORT_KEYS)
+        else:
+            # Same compact form orjson produces, so keys match either way
+            blob = json.dumps(request, sort_keys=True, ensure_ascii=False,
+                              separators=(',', ':')).encode('utf-8')
+        return hashlib.blake2b(blob, digest_size=16).hexdigest()
+    
+    def _complete(self, system_message, prompt):
+        """Run a chat completion and parse its JSON, reusing cached responses"""
+        request = {
+            "model": AI_MODEL,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": AI_TEMPERATURE,
+            "max_tokens": AI_MAX_TOKENS,
+            # JSON mode: the reply is always a parseable object, never fenced
+            # markdown that would send the document down the regex fallback
+            "response_format": {"type": "json_object"}
+        }
+        key = self._cache_key(request)
+        result = self._cached_response(key)
+        if result is None:
+            response = self.client.chat.completions.create(**request)
+            result = response.choices[0].message.content
+            # Parse before caching so a malformed reply is retried next time
+            parsed = self._parse_json(result)
+            self._cache_response(key, result)
+            return parsed
+        return self._parse_json(result)
+    
+    def _parse_json(self, result):
+        """Parse a JSON response body"""
+        if ORJSON_AVAILABLE:
+            return orjson.loads(result)
+        return json.loads(result)
+    
+    def _cached_response(self, key):
+        """Return the cached raw response for key, if present and fresh"""
+        with self._cache_lock:
+            cached = self._response_cache.get(key)
+            if cached is None:
+                return self._stored_response(key)
+            if time.monotonic() - cached[0] >= AI_CACHE_TTL:
+                del self._response_cache[key]
+                return None
+            self._response_cache.move_to_end(key)
+            return cached[1]
+    
+    def _cache_response(self, key, result):
+        """Store a raw response, evicting the least recently used entries"""
+        with self._cache_lock:
+            self._response_cache[key] = (time.monotonic(), result)
+            self._response_cache.move_to_end(key)
+            while len(self._response_cache) > AI_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
+            if self._cache_db is not None:
+                try:
+                    self._cache_db.execute("""
+                        INSERT INTO ai_response_cache (key, response, created_at) VALUES (?, ?, ?)
+                        ON CONFLICT(key) DO UPDATE SET
+                            response = excluded.response,
+                            created_at = excluded.created_at
+                    """, (key, result, time.time()))
+                    self._cache_db_writes += 1
+                    if self._cache_db_writes % AI_CACHE_PRUNE_INTERVAL == 0:
+                        self._prune_cache_db(self._cache_db)
+                    self._cache_db.commit()
+                except sqlite3.Error as e:
+                    print(f"AI cache write error: {str(e)}")
+    
+    def _prune_cache_db(self, db):
+        """Drop expired rows, then the oldest beyond AI_CACHE_DB_SIZE"""
+        db.execute("DELETE FROM ai_response_cache WHERE created_at < ?",
+                   (time.time() - AI_CACHE_TTL,))
+        db.execute("""
+            DELETE FROM ai_response_cache WHERE key IN (
+                SELECT key FROM ai_response_cache
+                ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (AI_CACHE_DB_SIZE,))
+    
+    def _stored_response(self, key):
+        """Look key up in the persistent cache; call with the cache lock held"""
+        if self._cache_db is None:
+            return None
+        try:
+            row = self._cache_db.execute(
+                "SELECT response, created_at FROM ai_response_cache WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"AI cache read error: {str(e)}")
+            return None
+        if row is None:
+            return None
+        age = time.time() - row[1]
+        if age >= AI_CACHE_TTL:
+            return None
+        # Keep the entry's original age so it expires on schedule in memory too
+        self._response_cache[key] = (time.monotonic() - age, row[0])
+        while len(self._response_cache) > AI_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
+        return row[0]
     
     def extract_contract_details(self, contract_text):
         """Extract key details from contract using GPT"""
-        prompt = f"""
-        Analyze the following contract text and extract key information in JSON format.
-        
-        Contract Text:
-        {contract_text[:4000]}
-        
-        IMPORTANT INSTRUCTIONS:
-        1. For vendor_name: Find the actual company/vendor name providing services (NOT the client). Look for company names with suffixes like Inc, LLC, Corp, Ltd, Company. The vendor is the party PROVIDING services.
-        2. For business_type: Determine what type of services the vendor provides based on the contract context.
-        3. For service_description: Provide a brief 1-2 sentence description of what services the vendor will provide.
-        
-        Extract the following information:
-        - vendor_name (the service provider company name, e.g., "Acme Technologies Inc")
-        - business_type (e.g., "Technology Services", "Consulting Services", "Marketing Services")
-        - service_description (brief description of services being provided)
-        - contract_number
-        - start_date
-        - end_date
-        - payment_terms
-        - total_value
-        - billing_frequency
-        - items (list of items/services with descriptions and prices)
-        - special_conditions
-        
-        Return ONLY valid JSON without any markdown formatting or backticks.
-        """
+        if not self._has_text(contract_text):
+            raise ValueError("No text could be read from the contract document")
+        prompt = CONTRACT_PROMPT_TEMPLATE.format(document=contract_text[:4000])
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": "You are a contract analysis expert specializing in vendor identification and service classification. Extract the vendor/supplier name (the party PROVIDING services), not the client name. Return only valid JSON without markdown."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=1500
-            )
-            
-            result = response.choices[0].message.content
-            return json.loads(result)
+            return self._complete(CONTRACT_SYSTEM_MESSAGE, prompt)
         except Exception as e:
             print(f"AI extraction error: {str(e)}")
             return self._fallback_extraction(contract_text, "contract")
     
     def extract_invoice_details(self, invoice_text):
         """Extract key details from invoice using GPT"""
-        prompt = f"""
-        Analyze the following invoice text and extract key information in JSON format:
-        
-        Invoice Text:
-        {invoice_text[:3000]}
-        
-        Extract the following information:
-        - vendor_name
-        - invoice_number
-        - invoice_date
-        - due_date
-        - total_amount
-        - subtotal
-        - tax_amount
-        - items (list with description, quantity, unit_price, total)
-        - payment_terms
-        - reference_contract_number (if mentioned)
-        
-        Return ONLY valid JSON without any markdown formatting.
-        """
+        if not self._has_text(invoice_text):
+            raise ValueError("No text could be read from the invoice document")
+        prompt = INVOICE_PROMPT_TEMPLATE.format(document=invoice_text[:3000])
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": "You are an invoice analysis expert. Extract information accurately and return only JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=1500
-            )
-            
-            result = response.choices[0].message.content
-            return json.loads(result)
+            return self._complete(INVOICE_SYSTEM_MESSAGE, prompt)
         except Exception as e:
             print(f"AI extraction error: {str(e)}")
             return self._fallback_extraction(invoice_text, "invoice")
     
+    def _has_text(self, text):
+        """Whether OCR found anything worth sending to the model"""
+        # Blank scans come back empty or as bare "--- Page N ---" markers.
+        # They are rejected rather than given the regex fallback, whose
+        # placeholder "Unknown" vendor would be matched or auto-created.
+        return bool(text) and WORD_PATTERN.search(PAGE_MARKER_PATTERN.sub('', text)) is not None
+    
     def _fallback_extraction(self, text, doc_type):
         """Fallback extraction using regex patterns"""
         extracted = {}
         
-        amount_pattern = r'\$?[\d,]+\.?\d*'
-        date_pattern = r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}'
-        
-        amounts = re.findall(amount_pattern, text)
-        dates = re.findall(date_pattern, text)
+        amounts = AMOUNT_PATTERN.findall(text)
+        dates = DATE_PATTERN.findall(text)
         
         if doc_type == "invoice":
             extracted = {
                 "vendor_name": "Unknown",
-                "invoice_number": re.search(r'Invoice\s*#?\s*(\w+)', text, re.I),
+                "invoice_number": INVOICE_NUMBER_PATTERN.search(text),
                 "invoice_date": dates[0] if dates else None,
                 "total_amount": amounts[0] if amounts else "0",
                 "items": []
@@ -116,7 +307,7 @@ class AIAnalyzer:
                 "vendor_name": "Unknown",
                 "business_type": "General Services",
                 "service_description": "Services as per contract",
-                "contract_number": re.search(r'Contract\s*#?\s*(\w+)', text, re.I),
+                "contract_number": CONTRACT_NUMBER_PATTERN.search(text),
                 "total_value": amounts[0] if amounts else "0",
                 "items": []
             }
@@ -129,12 +320,16 @@ class AIAnalyzer:
         warnings = []
         matches = []
         
-        if contract_details.get('vendor_name', '').lower() != invoice_details.get('vendor_name', '').lower():
-            if contract_details.get('vendor_name') and invoice_details.get('vendor_name'):
+        # Look each field up once; the extraction may return null for any of them
+        contract_vendor = contract_details.get('vendor_name') or ''
+        invoice_vendor = invoice_details.get('vendor_name') or ''
+        
+        if contract_vendor.lower() != invoice_vendor.lower():
+            if contract_vendor and invoice_vendor:
                 discrepancies.append({
                     "field": "Vendor Name",
-                    "contract_value": contract_details.get('vendor_name'),
-                    "invoice_value": invoice_details.get('vendor_name'),
+                    "contract_value": contract_vendor,
+                    "invoice_value": invoice_vendor,
                     "severity": "HIGH"
                 })
         else:
@@ -144,32 +339,35 @@ class AIAnalyzer:
         invoice_total = self._parse_amount(invoice_details.get('total_amount', '0'))
         
         if contract_total and invoice_total:
-            if abs(contract_total - invoice_total) > 0.01:
+            difference = abs(contract_total - invoice_total)
+            if difference > AMOUNT_TOLERANCE:
                 discrepancies.append({
                     "field": "Total Amount",
                     "contract_value": f"${contract_total:,.2f}",
                     "invoice_value": f"${invoice_total:,.2f}",
-                    "difference": f"${abs(contract_total - invoice_total):,.2f}",
+                    "difference": f"${difference:,.2f}",
                     "severity": "HIGH"
                 })
             else:
                 matches.append("Total Amount")
         
-        if invoice_details.get('reference_contract_number'):
-            if invoice_details['reference_contract_number'] != contract_details.get('contract_number'):
+        reference_number = invoice_details.get('reference_contract_number')
+        if reference_number:
+            contract_number = contract_details.get('contract_number')
+            if reference_number != contract_number:
                 warnings.append({
                     "field": "Contract Reference",
-                    "message": f"Invoice references contract {invoice_details['reference_contract_number']}, but provided contract is {contract_details.get('contract_number')}",
+                    "message": f"Invoice references contract {reference_number}, but provided contract is {contract_number}",
                     "severity": "MEDIUM"
                 })
         
-        contract_items = contract_details.get('items', [])
-        invoice_items = invoice_details.get('items', [])
+        contract_item_count = len(contract_details.get('items') or ())
+        invoice_item_count = len(invoice_details.get('items') or ())
         
-        if len(invoice_items) > len(contract_items):
+        if invoice_item_count > contract_item_count:
             warnings.append({
                 "field": "Items Count",
-                "message": f"Invoice has {len(invoice_items)} items, contract has {len(contract_items)} items",
+                "message": f"Invoice has {invoice_item_count} items, contract has {contract_item_count} items",
                 "severity": "MEDIUM"
             })
         
@@ -181,16 +379,19 @@ class AIAnalyzer:
                 "total_discrepancies": len(discrepancies),
                 "total_warnings": len(warnings),
                 "total_matches": len(matches),
-                "reconciliation_status": "PASSED" if len(discrepancies) == 0 else "FAILED"
+                "reconciliation_status": "FAILED" if discrepancies else "PASSED"
             }
         }
     
     def _parse_amount(self, amount_str):
-        """Parse amount string to float"""
+        """Parse amount string to Decimal so currency comparisons are exact"""
         if not amount_str:
-            return 0
+            return ZERO_AMOUNT
+        if isinstance(amount_str, Decimal):
+            return amount_str
         amount_str = str(amount_str).replace('$', '').replace(',', '')
         try:
-            return float(amount_str)
-        except:
-            return 0
\ No newline at end of file
+            amount = Decimal(amount_str)
+        except InvalidOperation:
+            return ZERO_AMOUNT
+        return amount if amount.is_finite() else ZERO_AMOUNT
\ No newline at end of file
@@ -2,12 +2,14 @@ from flask import Flask, request, jsonify, send_from_directory, send_file
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
+import atexit
 import json
 from dotenv import load_dotenv
 import uuid
 from datetime import datetime
 import base64
 import mimetypes
+from concurrent.futures import ThreadPoolExecutor
 
 from ocr_processor import OCRProcessor
 from ai_analyzer import AIAnalyzer
@@ -30,6 +32,10 @@ os.makedirs(app.config['VENDORS_FOLDER'], exist_ok=True)
 
 ocr_processor = OCRProcessor()
 ai_analyzer = AIAnalyzer(os.getenv('OPENAI_API_KEY'))
+atexit.register(ai_analyzer.close)
+# The contract and invoice go through OCR and extraction independently, and
+# both stages wait on tesseract or the OpenAI API, so run each pair side by side
+document_executor = ThreadPoolExecutor(max_workers=4)
 
 reconciliation_sessions = {}
 vendors_storage = {}
@@ -96,12 +102,16 @@ def process_reconciliation(session_id):
         session = reconciliation_sessions[session_id]
         
         session['status'] = 'processing_ocr'
-        contract_text = ocr_processor.process_document(session['contract_path'])
-        invoice_text = ocr_processor.process_document(session['invoice_path'])
+        contract_future = document_executor.submit(ocr_processor.process_document, session['contract_path'])
+        invoice_future = document_executor.submit(ocr_processor.process_document, session['invoice_path'])
+        contract_text = contract_future.result()
+        invoice_text = invoice_future.result()
         
         session['status'] = 'extracting_details'
-        contract_details = ai_analyzer.extract_contract_details(contract_text)
-        invoice_details = ai_analyzer.extract_invoice_details(invoice_text)
+        contract_future = document_executor.submit(ai_analyzer.extract_contract_details, contract_text)
+        invoice_future = document_executor.submit(ai_analyzer.extract_invoice_details, invoice_text)
+        contract_details = contract_future.result()
+        invoice_details = invoice_future.result()
         
         session['status'] = 'comparing'
         comparison_results = ai_analyzer.compare_documents(contract_details, invoice_details)
@@ -1,13 +1,30 @@
 """
 Database models for Invoice Reconciliation Platform
 """
-from sqlalchemy import create_engine, Column, String, Float, DateTime, Text, JSON, Boolean, ForeignKey, Integer
+from sqlalchemy import create_engine, event, Column, String, Float, DateTime, Text, JSON, Boolean, ForeignKey, Integer, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from datetime import datetime
 import uuid
 import os
 
+# Use orjson for JSON columns when available
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Applied to every SQLite connection the engine opens: WAL lets readers run
+# alongside the writer and NORMAL sync drops the per-commit journal fsync
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",  # 64MB page cache
+    "PRAGMA busy_timeout=5000",
+)
+
 Base = declarative_base()
 
 class Vendor(Base):
@@ -36,6 +53,11 @@ class Vendor(Base):
 class Contract(Base):
     """Contract model for storing contract details"""
     __tablename__ = 'contracts'
+    __table_args__ = (
+        # Active contracts, by vendor or by upcoming end date
+        Index('idx_contracts_status_vendor', 'status', 'vendor_id'),
+        Index('idx_contracts_status_end_date', 'status', 'end_date'),
+    )
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     vendor_id = Column(String(36), ForeignKey('vendors.id'), nullable=False)
@@ -82,6 +104,15 @@ class ContractLineItem(Base):
 class Invoice(Base):
     """Invoice model for storing invoice details"""
     __tablename__ = 'invoices'
+    __table_args__ = (
+        # Partial index over open invoices only, for the pending/overdue lists.
+        # Written as OR so SQLite can match it against either query's filter.
+        Index(
+            'idx_invoices_open_due_date', 'due_date',
+            sqlite_where=text("status = 'pending' OR status = 'overdue'"),
+            postgresql_where=text("status = 'pending' OR status = 'overdue'")
+        ),
+    )
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     vendor_id = Column(String(36), ForeignKey('vendors.id'), nullable=False)
@@ -128,6 +159,11 @@ class InvoiceLineItem(Base):
 class Reconciliation(Base):
     """Reconciliation records between contracts and invoices"""
     __tablename__ = 'reconciliations'
+    __table_args__ = (
+        # Failed-reconciliation and vendor history lists, newest first
+        Index('idx_reconciliations_status_performed_at', 'status', 'performed_at'),
+        Index('idx_reconciliations_vendor_performed_at', 'vendor_id', 'performed_at'),
+    )
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     vendor_id = Column(String(36), ForeignKey('vendors.id'))
@@ -145,7 +181,7 @@ class Reconciliation(Base):
     matches = Column(JSON)
     summary = Column(JSON)
     
-    performed_at = Column(DateTime, default=datetime.utcnow)
+    performed_at = Column(DateTime, default=datetime.utcnow, index=True)
     performed_by = Column(String(255))  # User who initiated
     
     # Relationships
@@ -165,12 +201,16 @@ class ReconciliationSession(Base):
     error_message = Column(Text)
     results = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
-    expires_at = Column(DateTime)  # Auto-cleanup old sessions
+    expires_at = Column(DateTime, index=True)  # Auto-cleanup old sessions
 
 
 class AuditLog(Base):
     """Audit trail for all system activities"""
     __tablename__ = 'audit_logs'
+    __table_args__ = (
+        # Per-entity history, newest first
+        Index('idx_audit_logs_entity', 'entity_type', 'entity_id', 'performed_at'),
+    )
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     entity_type = Column(String(50))  # vendor, contract, invoice, reconciliation
@@ -183,21 +223,55 @@ class AuditLog(Base):
 
 
 # Database initialization
-def init_db(database_url=None):
-    """Initialize the database"""
+# Engines own the connection pool, so keep one engine and sessionmaker per
+# URL for the life of the process instead of building them per session
+_databases = {}
+
+
+def _orjson_dumps(value):
+    """Serialize a JSON column value; the dialects expect text"""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Configure a new SQLite connection before it joins the pool"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA database_list")
+    in_memory = not cursor.fetchone()[2]  # main database has no file path
+    for pragma_sql in SQLITE_PRAGMAS:
+        if in_memory and 'journal_mode' in pragma_sql:
+            continue  # in-memory databases have no journal file
+        cursor.execute(pragma_sql)
+    cursor.close()
+
+
+def _get_database(database_url=None):
+    """Get the shared (engine, Session) pair for database_url"""
     if not database_url:
         database_url = os.getenv('DATABASE_URL', 'sqlite:///reconciliation.db')
     
-    engine = create_engine(database_url, echo=False)
+    database = _databases.get(database_url)
+    if database is None:
+        engine_options = {}
+        if ORJSON_AVAILABLE:
+            engine_options['json_serializer'] = _orjson_dumps
+            engine_options['json_deserializer'] = orjson.loads
+        engine = create_engine(database_url, echo=False, pool_pre_ping=True, **engine_options)
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', _apply_sqlite_pragmas)
+        database = (engine, sessionmaker(bind=engine))
+        _databases[database_url] = database
+    return database
+
+
+def init_db(database_url=None):
+    """Initialize the database"""
+    engine, Session = _get_database(database_url)
     Base.metadata.create_all(engine)
-    
-    Session = sessionmaker(bind=engine)
     return Session()
 
 
 def get_session():
     """Get database session"""
-    database_url = os.getenv('DATABASE_URL', 'sqlite:///reconciliation.db')
-    engine = create_engine(database_url, echo=False)
-    Session = sessionmaker(bind=engine)
-    return Session()
\ No newline at end of file
+    _, Session = _get_database()
+    return Session()
@@ -3,7 +3,7 @@ Repository layer for database operations
 """
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy import or_, and_, desc
 from models import (
     Vendor, Contract, Invoice, Reconciliation, 
@@ -16,15 +16,26 @@ import json
 class BaseRepository:
     """Base repository with common CRUD operations"""
     
+    # Loader options for list queries, so converting each row to a dict
+    # doesn't lazy-load its relationships one query at a time
+    list_options = ()
+    
     def __init__(self, session: Session, model):
         self.session = session
         self.model = model
     
-    def create(self, **kwargs) -> Any:
+    def _save(self, commit: bool):
+        """Commit, or flush when the caller will commit with more work"""
+        if commit:
+            self.session.commit()
+        else:
+            self.session.flush()
+    
+    def create(self, commit: bool = True, **kwargs) -> Any:
         """Create a new entity"""
         entity = self.model(**kwargs)
         self.session.add(entity)
-        self.session.commit()
+        self._save(commit)
         self.session.refresh(entity)
         return entity
     
@@ -34,18 +45,22 @@ class BaseRepository:
             self.model.id == entity_id
         ).first()
     
+    def _list_query(self):
+        """Query for a list of entities with relationships eager loaded"""
+        return self.session.query(self.model).options(*self.list_options)
+    
     def get_all(self, limit: int = 100, offset: int = 0) -> List[Any]:
         """Get all entities with pagination"""
-        return self.session.query(self.model).limit(limit).offset(offset).all()
+        return self._list_query().limit(limit).offset(offset).all()
     
-    def update(self, entity_id: str, **kwargs) -> Optional[Any]:
+    def update(self, entity_id: str, commit: bool = True, **kwargs) -> Optional[Any]:
         """Update an entity"""
         entity = self.get_by_id(entity_id)
         if entity:
             for key, value in kwargs.items():
                 setattr(entity, key, value)
             entity.updated_at = datetime.utcnow()
-            self.session.commit()
+            self._save(commit)
             self.session.refresh(entity)
         return entity
     
@@ -60,7 +75,7 @@ class BaseRepository:
     
     def search(self, filters: Dict[str, Any], limit: int = 100) -> List[Any]:
         """Search with filters"""
-        query = self.session.query(self.model)
+        query = self._list_query()
         for key, value in filters.items():
             if hasattr(self.model, key):
                 query = query.filter(getattr(self.model, key) == value)
@@ -87,7 +102,9 @@ class VendorRepository(BaseRepository):
     
     def get_vendor_with_contracts(self, vendor_id: str) -> Optional[Vendor]:
         """Get vendor with all contracts"""
-        return self.session.query(Vendor).filter(
+        return self.session.query(Vendor).options(
+            selectinload(Vendor.contracts)
+        ).filter(
             Vendor.id == vendor_id
         ).first()
     
@@ -106,6 +123,8 @@ class VendorRepository(BaseRepository):
 class ContractRepository(BaseRepository):
     """Repository for Contract operations"""
     
+    list_options = (joinedload(Contract.vendor), selectinload(Contract.line_items))
+    
     def __init__(self, session: Session):
         super().__init__(session, Contract)
     
@@ -117,7 +136,7 @@ class ContractRepository(BaseRepository):
     
     def get_active_contracts(self, vendor_id: Optional[str] = None) -> List[Contract]:
         """Get active contracts, optionally filtered by vendor"""
-        query = self.session.query(Contract).filter(
+        query = self._list_query().filter(
             Contract.status == 'active'
         )
         if vendor_id:
@@ -127,7 +146,7 @@ class ContractRepository(BaseRepository):
     def get_expiring_contracts(self, days: int = 30) -> List[Contract]:
         """Get contracts expiring within specified days"""
         expiry_date = datetime.utcnow() + timedelta(days=days)
-        return self.session.query(Contract).filter(
+        return self._list_query().filter(
             and_(
                 Contract.end_date <= expiry_date,
                 Contract.end_date >= datetime.utcnow(),
@@ -135,7 +154,8 @@ class ContractRepository(BaseRepository):
             )
         ).all()
     
-    def create_with_line_items(self, contract_data: dict, line_items: List[dict]) -> Contract:
+    def create_with_line_items(self, contract_data: dict, line_items: List[dict],
+                               commit: bool = True) -> Contract:
         """Create contract with line items"""
         contract = Contract(**contract_data)
         self.session.add(contract)
@@ -144,7 +164,7 @@ class ContractRepository(BaseRepository):
             item = ContractLineItem(contract_id=contract.id, **item_data)
             self.session.add(item)
         
-        self.session.commit()
+        self._save(commit)
         self.session.refresh(contract)
         return contract
 
@@ -152,6 +172,8 @@ class ContractRepository(BaseRepository):
 class InvoiceRepository(BaseRepository):
     """Repository for Invoice operations"""
     
+    list_options = (joinedload(Invoice.vendor), selectinload(Invoice.line_items))
+    
     def __init__(self, session: Session):
         super().__init__(session, Invoice)
     
@@ -163,7 +185,7 @@ class InvoiceRepository(BaseRepository):
     
     def get_pending_invoices(self, vendor_id: Optional[str] = None) -> List[Invoice]:
         """Get pending invoices"""
-        query = self.session.query(Invoice).filter(
+        query = self._list_query().filter(
             Invoice.status == 'pending'
         )
         if vendor_id:
@@ -172,14 +194,15 @@ class InvoiceRepository(BaseRepository):
     
     def get_overdue_invoices(self) -> List[Invoice]:
         """Get overdue invoices"""
-        return self.session.query(Invoice).filter(
+        return self._list_query().filter(
             and_(
                 Invoice.due_date < datetime.utcnow(),
-                Invoice.status.in_(['pending', 'overdue'])
+                or_(Invoice.status == 'pending', Invoice.status == 'overdue')
             )
         ).all()
     
-    def create_with_line_items(self, invoice_data: dict, line_items: List[dict]) -> Invoice:
+    def create_with_line_items(self, invoice_data: dict, line_items: List[dict],
+                               commit: bool = True) -> Invoice:
         """Create invoice with line items"""
         invoice = Invoice(**invoice_data)
         self.session.add(invoice)
@@ -188,13 +211,13 @@ class InvoiceRepository(BaseRepository):
             item = InvoiceLineItem(invoice_id=invoice.id, **item_data)
             self.session.add(item)
         
-        self.session.commit()
+        self._save(commit)
         self.session.refresh(invoice)
         return invoice
     
     def get_invoices_by_contract(self, contract_number: str) -> List[Invoice]:
         """Get all invoices referencing a contract"""
-        return self.session.query(Invoice).filter(
+        return self._list_query().filter(
             Invoice.reference_contract_number == contract_number
         ).all()
 
@@ -202,18 +225,24 @@ class InvoiceRepository(BaseRepository):
 class ReconciliationRepository(BaseRepository):
     """Repository for Reconciliation operations"""
     
+    list_options = (
+        joinedload(Reconciliation.vendor),
+        joinedload(Reconciliation.contract),
+        joinedload(Reconciliation.invoice)
+    )
+    
     def __init__(self, session: Session):
         super().__init__(session, Reconciliation)
     
     def get_recent_reconciliations(self, limit: int = 10) -> List[Reconciliation]:
         """Get recent reconciliations"""
-        return self.session.query(Reconciliation).order_by(
+        return self._list_query().order_by(
             desc(Reconciliation.performed_at)
         ).limit(limit).all()
     
     def get_failed_reconciliations(self, vendor_id: Optional[str] = None) -> List[Reconciliation]:
         """Get failed reconciliations"""
-        query = self.session.query(Reconciliation).filter(
+        query = self._list_query().filter(
             Reconciliation.status == 'failed'
         )
         if vendor_id:
@@ -222,7 +251,7 @@ class ReconciliationRepository(BaseRepository):
     
     def get_vendor_reconciliation_history(self, vendor_id: str) -> List[Reconciliation]:
         """Get reconciliation history for a vendor"""
-        return self.session.query(Reconciliation).filter(
+        return self._list_query().filter(
             Reconciliation.vendor_id == vendor_id
         ).order_by(desc(Reconciliation.performed_at)).all()
     
@@ -232,7 +261,8 @@ class ReconciliationRepository(BaseRepository):
         contract_id: str,
         invoice_id: str,
         comparison_results: dict,
-        performed_by: str = 'system'
+        performed_by: str = 'system',
+        commit: bool = True
     ) -> Reconciliation:
         """Create a reconciliation record from comparison results"""
         reconciliation = Reconciliation(
@@ -250,7 +280,7 @@ class ReconciliationRepository(BaseRepository):
             performed_by=performed_by
         )
         self.session.add(reconciliation)
-        self.session.commit()
+        self._save(commit)
         self.session.refresh(reconciliation)
         return reconciliation
 
@@ -263,13 +293,10 @@ class ReconciliationSessionRepository(BaseRepository):
     
     def cleanup_expired_sessions(self) -> int:
         """Clean up expired sessions"""
-        expired_sessions = self.session.query(ReconciliationSession).filter(
+        # One DELETE over the expires_at index rather than loading each row
+        count = self.session.query(ReconciliationSession).filter(
             ReconciliationSession.expires_at < datetime.utcnow()
-        ).all()
-        
-        count = len(expired_sessions)
-        for session in expired_sessions:
-            self.session.delete(session)
+        ).delete(synchronize_session=False)
         
         self.session.commit()
         return count
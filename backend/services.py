@@ -4,7 +4,11 @@ Service layer for business logic
 from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 import os
+import atexit
+import time
 import shutil
+import threading
+from collections import OrderedDict
 from repositories import (
     VendorRepository, ContractRepository, InvoiceRepository,
     ReconciliationRepository, ReconciliationSessionRepository,
@@ -17,6 +21,68 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Date formats accepted from AI-extracted fields, tried in order
+DATE_FORMATS = (
+    '%Y-%m-%d',
+    '%m/%d/%Y',
+    '%d/%m/%Y',
+    '%Y/%m/%d',
+    '%m-%d-%Y',
+    '%d-%m-%Y'
+)
+
+# Shared processors; services are built per request, but the OpenAI client
+# keeps a connection pool that should live for the whole process
+_ocr_processor = None
+_ai_analyzer = None
+
+
+def get_ocr_processor() -> OCRProcessor:
+    """Get the shared OCR processor (singleton pattern)"""
+    global _ocr_processor
+    if _ocr_processor is None:
+        _ocr_processor = OCRProcessor()
+    return _ocr_processor
+
+
+def get_ai_analyzer() -> AIAnalyzer:
+    """Get the shared AI analyzer (singleton pattern)"""
+    global _ai_analyzer
+    if _ai_analyzer is None:
+        _ai_analyzer = AIAnalyzer(os.getenv('OPENAI_API_KEY'))
+        atexit.register(_ai_analyzer.close)
+    return _ai_analyzer
+
+
+# Seconds a vendor list stays cached. Each gunicorn worker keeps its own
+# copy, and a write only clears the copy in the worker that handled it, so
+# this TTL is how long another worker may keep serving the old list. Set it
+# to 0 to disable the cache. Every vendor write path in this module (create,
+# update and soft delete, and the auto-create while processing a contract)
+# calls invalidate_vendor_list_cache().
+VENDOR_LIST_CACHE_TTL = float(os.getenv('VENDOR_LIST_CACHE_TTL', '60'))
+_vendor_list_cache = {}  # active_only -> (monotonic timestamp, vendor dicts)
+
+
+def invalidate_vendor_list_cache():
+    """Drop cached vendor lists so the next read sees recent writes"""
+    _vendor_list_cache.clear()
+
+
+# Active and expiring contract lists polled by the dashboard. Processing a
+# contract document clears this, and so does any vendor write, since each
+# contract dict carries its vendor's name
+CONTRACT_LIST_CACHE_TTL = float(os.getenv('CONTRACT_LIST_CACHE_TTL', '60'))
+CONTRACT_LIST_CACHE_SIZE = 128  # days and vendor_id come from requests
+_contract_list_cache = OrderedDict()  # (list kind, argument) -> (monotonic timestamp, contract dicts)
+_contract_list_lock = threading.Lock()  # LRU bookkeeping mutates the OrderedDict on reads
+
+
+def invalidate_contract_list_cache():
+    """Drop cached contract lists so the next read sees recent writes"""
+    with _contract_list_lock:
+        _contract_list_cache.clear()
+
 
 class VendorService:
     """Service for vendor management"""
@@ -38,9 +104,9 @@ class VendorService:
                     'vendor_id': existing.id
                 }
             
-            vendor = self.vendor_repo.create(**vendor_data)
+            vendor = self.vendor_repo.create(commit=False, **vendor_data)
             
-            # Log the action
+            # Log the action; this commits the vendor and its audit row together
             self.audit_repo.log_action(
                 entity_type='vendor',
                 entity_id=vendor.id,
@@ -48,6 +114,8 @@ class VendorService:
                 changes=vendor_data,
                 performed_by=created_by
             )
+            invalidate_vendor_list_cache()
+            invalidate_contract_list_cache()
             
             return {
                 'success': True,
@@ -66,14 +134,14 @@ class VendorService:
     def update_vendor(self, vendor_id: str, updates: dict, updated_by: str = 'system') -> dict:
         """Update vendor information"""
         try:
-            vendor = self.vendor_repo.update(vendor_id, **updates)
+            vendor = self.vendor_repo.update(vendor_id, commit=False, **updates)
             if not vendor:
                 return {
                     'success': False,
                     'message': 'Vendor not found'
                 }
             
-            # Log the action
+            # Log the action; this commits the update and its audit row together
             self.audit_repo.log_action(
                 entity_type='vendor',
                 entity_id=vendor_id,
@@ -81,6 +149,8 @@ class VendorService:
                 changes=updates,
                 performed_by=updated_by
             )
+            invalidate_vendor_list_cache()
+            invalidate_contract_list_cache()
             
             return {
                 'success': True,
@@ -107,14 +177,24 @@ class VendorService:
             self.session.close()
     
     def list_vendors(self, active_only: bool = True) -> List[dict]:
-        """List all vendors"""
+        """List all vendors
+        
+        Served from a cache for up to VENDOR_LIST_CACHE_TTL seconds, so a
+        write handled by another worker may take that long to show up.
+        """
         try:
+            cached = _vendor_list_cache.get(active_only)
+            if cached and time.monotonic() - cached[0] < VENDOR_LIST_CACHE_TTL:
+                return list(cached[1])
+            
             if active_only:
                 vendors = self.vendor_repo.get_active_vendors()
             else:
                 vendors = self.vendor_repo.get_all()
             
-            return [self._vendor_to_dict(v) for v in vendors]
+            vendor_dicts = [self._vendor_to_dict(v) for v in vendors]
+            _vendor_list_cache[active_only] = (time.monotonic(), vendor_dicts)
+            return list(vendor_dicts)
         finally:
             self.session.close()
     
@@ -168,8 +248,8 @@ class ContractService:
         self.contract_repo = ContractRepository(self.session)
         self.vendor_repo = VendorRepository(self.session)
         self.audit_repo = AuditLogRepository(self.session)
-        self.ocr_processor = OCRProcessor()
-        self.ai_analyzer = AIAnalyzer(os.getenv('OPENAI_API_KEY'))
+        self.ocr_processor = get_ocr_processor()
+        self.ai_analyzer = get_ai_analyzer()
     
     def process_contract_document(
         self, 
@@ -185,6 +265,7 @@ class ContractService:
             contract_details = self.ai_analyzer.extract_contract_details(contract_text)
             
             # If vendor_id not provided, try to find or create vendor
+            vendor_created = False
             if not vendor_id:
                 vendor_name = contract_details.get('vendor_name')
                 if vendor_name:
@@ -192,10 +273,12 @@ class ContractService:
                     if not vendor:
                         # Create new vendor
                         vendor = self.vendor_repo.create(
+                            commit=False,
                             name=vendor_name,
                             business_type=contract_details.get('business_type'),
                             metadata={'auto_created': True}
                         )
+                        vendor_created = True
                     vendor_id = vendor.id
             
             # Prepare contract data
@@ -231,9 +314,11 @@ class ContractService:
                     })
             
             # Create contract with line items
-            contract = self.contract_repo.create_with_line_items(contract_data, line_items)
+            contract = self.contract_repo.create_with_line_items(
+                contract_data, line_items, commit=False
+            )
             
-            # Log the action
+            # Log the action; this commits the vendor, contract and audit row together
             self.audit_repo.log_action(
                 entity_type='contract',
                 entity_id=contract.id,
@@ -241,6 +326,9 @@ class ContractService:
                 changes={'source': 'document_processing'},
                 performed_by='system'
             )
+            invalidate_contract_list_cache()
+            if vendor_created:
+                invalidate_vendor_list_cache()
             
             return {
                 'success': True,
@@ -270,17 +358,33 @@ class ContractService:
     
     def list_contracts(self, vendor_id: Optional[str] = None) -> List[dict]:
         """List contracts"""
-        try:
-            contracts = self.contract_repo.get_active_contracts(vendor_id)
-            return [self._contract_to_dict(c) for c in contracts]
-        finally:
-            self.session.close()
+        return self._cached_contract_list(
+            ('active', vendor_id), self.contract_repo.get_active_contracts, vendor_id
+        )
     
     def get_expiring_contracts(self, days: int = 30) -> List[dict]:
         """Get contracts expiring soon"""
+        return self._cached_contract_list(
+            ('expiring', days), self.contract_repo.get_expiring_contracts, days
+        )
+    
+    def _cached_contract_list(self, cache_key, query, argument) -> List[dict]:
+        """Run a contract list query, served from a short-lived cache between writes"""
         try:
-            contracts = self.contract_repo.get_expiring_contracts(days)
-            return [self._contract_to_dict(c) for c in contracts]
+            with _contract_list_lock:
+                cached = _contract_list_cache.get(cache_key)
+                if cached and time.monotonic() - cached[0] < CONTRACT_LIST_CACHE_TTL:
+                    _contract_list_cache.move_to_end(cache_key)
+                    return list(cached[1])
+            
+            contract_dicts = [self._contract_to_dict(c) for c in query(argument)]
+            with _contract_list_lock:
+                _contract_list_cache[cache_key] = (time.monotonic(), contract_dicts)
+                _contract_list_cache.move_to_end(cache_key)
+                # Evict the least recently used lists, not every hot entry
+                while len(_contract_list_cache) > CONTRACT_LIST_CACHE_SIZE:
+                    _contract_list_cache.popitem(last=False)
+            return list(contract_dicts)
         finally:
             self.session.close()
     
@@ -331,16 +435,7 @@ class ContractService:
             return None
         
         # Try common date formats
-        formats = [
-            '%Y-%m-%d',
-            '%m/%d/%Y',
-            '%d/%m/%Y',
-            '%Y/%m/%d',
-            '%m-%d-%Y',
-            '%d-%m-%Y'
-        ]
-        
-        for fmt in formats:
+        for fmt in DATE_FORMATS:
             try:
                 return datetime.strptime(date_str, fmt)
             except:
@@ -358,8 +453,8 @@ class InvoiceService:
         self.vendor_repo = VendorRepository(self.session)
         self.contract_repo = ContractRepository(self.session)
         self.audit_repo = AuditLogRepository(self.session)
-        self.ocr_processor = OCRProcessor()
-        self.ai_analyzer = AIAnalyzer(os.getenv('OPENAI_API_KEY'))
+        self.ocr_processor = get_ocr_processor()
+        self.ai_analyzer = get_ai_analyzer()
     
     def process_invoice_document(
         self, 
@@ -414,9 +509,11 @@ class InvoiceService:
                     })
             
             # Create invoice with line items
-            invoice = self.invoice_repo.create_with_line_items(invoice_data, line_items)
+            invoice = self.invoice_repo.create_with_line_items(
+                invoice_data, line_items, commit=False
+            )
             
-            # Log the action
+            # Log the action; this commits the invoice and its audit row together
             self.audit_repo.log_action(
                 entity_type='invoice',
                 entity_id=invoice.id,
@@ -517,16 +614,7 @@ class InvoiceService:
             return None
         
         # Try common date formats
-        formats = [
-            '%Y-%m-%d',
-            '%m/%d/%Y',
-            '%d/%m/%Y',
-            '%Y/%m/%d',
-            '%m-%d-%Y',
-            '%d-%m-%Y'
-        ]
-        
-        for fmt in formats:
+        for fmt in DATE_FORMATS:
             try:
                 return datetime.strptime(date_str, fmt)
             except:
@@ -544,7 +632,7 @@ class ReconciliationService:
         self.contract_repo = ContractRepository(self.session)
         self.invoice_repo = InvoiceRepository(self.session)
         self.audit_repo = AuditLogRepository(self.session)
-        self.ai_analyzer = AIAnalyzer(os.getenv('OPENAI_API_KEY'))
+        self.ai_analyzer = get_ai_analyzer()
     
     def reconcile_contract_invoice(
         self,
@@ -579,10 +667,11 @@ class ReconciliationService:
                 contract_id=contract_id,
                 invoice_id=invoice_id,
                 comparison_results=comparison_results,
-                performed_by=performed_by
+                performed_by=performed_by,
+                commit=False
             )
             
-            # Log the action
+            # Log the action; this commits the record and its audit row together
             self.audit_repo.log_action(
                 entity_type='reconciliation',
                 entity_id=reconciliation.id,
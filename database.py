@@ -7,17 +7,26 @@ Supports both SQLite (development) and PostgreSQL (production)
 import os
 import json
 import logging
+import threading
+import weakref
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 
 # Try to import PostgreSQL support, fallback to SQLite
 try:
     import psycopg2
-    from psycopg2.extras import RealDictCursor
+    from psycopg2.extras import RealDictCursor, execute_values
     POSTGRES_AVAILABLE = True
 except ImportError:
     POSTGRES_AVAILABLE = False
 
+# Use orjson for metadata (de)serialization when available
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 import sqlite3
 from sqlite3 import Row
 
@@ -25,48 +34,180 @@ from sqlite3 import Row
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Applied to every SQLite connection: WAL lets readers run alongside the
+# writer and NORMAL sync drops the per-commit fsync of the rollback journal
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA cache_size=-64000;",  # 64MB page cache
+    "PRAGMA busy_timeout=5000;",
+)
+
+# INSERT/UPDATE ... RETURNING needs SQLite 3.35+
+SQLITE_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Distinct UPDATE column sets kept per manager
+UPDATE_SQL_CACHE_SIZE = 64
+
+VENDOR_INSERT_COLUMNS = (
+    'id', 'name', 'business_description', 'effective_date', 'renewal_date',
+    'reconciliation_summary', 'upload_date', 'created_at', 'updated_at',
+    'status', 'contract_filename', 'contract_content', 'contract_file_path', 'metadata'
+)
+
+# Everything but contract_content: the list view never shows the contract
+# text, which is served per vendor by get_vendor / the contract endpoint
+VENDOR_LIST_COLUMNS = (
+    'id', 'name', 'business_description', 'effective_date', 'renewal_date',
+    'reconciliation_summary', 'upload_date', 'created_at', 'updated_at',
+    'status', 'contract_filename', 'contract_file_path', 'metadata'
+)
+
+VENDOR_STATS_SQL = """
+SELECT COUNT(*) AS total_vendors,
+       SUM(CASE WHEN status = 'active' THEN 1 ELSE 0 END) AS active_vendors
+FROM vendors;
+"""
+
+def _json_dumps(value: Any) -> str:
+    """Serialize a metadata value to JSON text"""
+    if ORJSON_AVAILABLE:
+        # Stringify non-str dict keys the way json.dumps does
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(value)
+
+def _json_loads(text: Any) -> Any:
+    """Parse JSON text stored in a metadata column"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(text)
+    return json.loads(text)
+
+class _SQLiteHandle:
+    """Holds a thread's SQLite connection in thread-local storage"""
+    __slots__ = ('connection', '__weakref__')
+    
+    def __init__(self, connection):
+        self.connection = connection
+
 class DatabaseManager:
     """Unified database manager supporting both PostgreSQL and SQLite"""
     
     def __init__(self):
         self.db_url = os.environ.get('DATABASE_URL')
         self.use_postgres = POSTGRES_AVAILABLE and self.db_url and self.db_url.startswith('postgresql')
+        self.placeholder = '%s' if self.use_postgres else '?'
+        self._build_statements()
+        self._local = threading.local()  # per-thread SQLite connection handle
+        self._sqlite_connections = []  # every connection opened, so close() reaches them all
+        self._idle_sqlite_connections = []  # released by threads that have exited
+        # Reentrant: a handle's finalizer can run during GC while this thread holds it
+        self._sqlite_lock = threading.RLock()
+        self._postgres_connection = None
         
         if self.use_postgres:
             logger.info("Using PostgreSQL database")
-            self.connection = None
             self._connect_postgres()
         else:
             logger.info("Using SQLite database (development mode)")
             self.db_path = os.environ.get('SQLITE_DB', 'invoices.db')
-            self.connection = None
             self._connect_sqlite()
         
         self._create_tables()
     
+    def _build_statements(self):
+        """Render the fixed vendor statements once for this backend's placeholder
+        
+        Identical SQL text lets each connection's prepared-statement cache
+        reuse the parsed statement instead of compiling it per call.
+        """
+        p = self.placeholder
+        self.supports_returning = self.use_postgres or SQLITE_RETURNING
+        insert_sql = (
+            f"INSERT INTO vendors ({', '.join(VENDOR_INSERT_COLUMNS)}) "
+            f"VALUES ({', '.join([p] * len(VENDOR_INSERT_COLUMNS))})"
+        )
+        self.insert_vendor_sql = insert_sql + (" RETURNING *;" if self.supports_returning else ";")
+        # execute_values expands a single %s into a multi-row VALUES list
+        self.insert_vendors_sql = (
+            f"INSERT INTO vendors ({', '.join(VENDOR_INSERT_COLUMNS)}) VALUES %s"
+            if self.use_postgres else insert_sql
+        )
+        self.has_vendors_sql = "SELECT 1 FROM vendors LIMIT 1;"
+        self._update_vendor_sql_cache = {}  # column tuple -> UPDATE statement
+        self.select_vendor_sql = f"SELECT * FROM vendors WHERE id = {p};"
+        self.delete_vendor_sql = f"DELETE FROM vendors WHERE id = {p};"
+        self.list_vendors_sql = (
+            f"SELECT {', '.join(VENDOR_LIST_COLUMNS)} FROM vendors "
+            f"ORDER BY created_at DESC, id DESC;"
+        )
+    
+    @property
+    def connection(self):
+        """Database connection for the calling thread
+        
+        PostgreSQL shares one autocommit connection. SQLite keeps one
+        long-lived connection per thread so that concurrent requests never
+        interleave statements or commit each other's transactions.
+        """
+        if self.use_postgres:
+            return self._postgres_connection
+        handle = getattr(self._local, 'handle', None)
+        if handle is None:
+            return self._connect_sqlite()
+        return handle.connection
+    
     def _connect_postgres(self):
         """Connect to PostgreSQL database"""
         try:
-            self.connection = psycopg2.connect(
+            self._postgres_connection = psycopg2.connect(
                 self.db_url,
                 cursor_factory=RealDictCursor
             )
-            self.connection.autocommit = True
+            self._postgres_connection.autocommit = True
             logger.info("Connected to PostgreSQL successfully")
         except Exception as e:
             logger.error(f"Failed to connect to PostgreSQL: {e}")
             raise
     
     def _connect_sqlite(self):
-        """Connect to SQLite database"""
+        """Open the calling thread's SQLite connection"""
+        in_memory = self.db_path == ':memory:'
         try:
-            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
-            self.connection.row_factory = Row  # Enable dict-like access
-            logger.info(f"Connected to SQLite database: {self.db_path}")
+            with self._sqlite_lock:
+                if in_memory and self._sqlite_connections:
+                    # Each connection to :memory: is a separate, empty database,
+                    # so every thread shares the first one
+                    connection = self._sqlite_connections[0]
+                elif self._idle_sqlite_connections:
+                    # Reuse a connection left by an exited thread, so a
+                    # thread-per-request server doesn't reconnect per request
+                    connection = self._idle_sqlite_connections.pop()
+                else:
+                    connection = sqlite3.connect(self.db_path, check_same_thread=False)
+                    connection.row_factory = Row  # Enable dict-like access
+                    for pragma_sql in SQLITE_PRAGMAS:
+                        if in_memory and 'journal_mode' in pragma_sql:
+                            continue  # in-memory databases have no journal file
+                        connection.execute(pragma_sql)
+                    self._sqlite_connections.append(connection)
+                    # Once per thread under a threaded server, so keep it quiet
+                    logger.debug(f"Connected to SQLite database: {self.db_path}")
+            handle = _SQLiteHandle(connection)
+            # The thread-local handle is dropped when its thread exits
+            weakref.finalize(handle, self._release_sqlite, connection)
+            self._local.handle = handle
+            return connection
         except Exception as e:
             logger.error(f"Failed to connect to SQLite: {e}")
             raise
     
+    def _release_sqlite(self, connection):
+        """Return an exited thread's connection for reuse, unless closed since"""
+        with self._sqlite_lock:
+            if self.db_path != ':memory:' and connection in self._sqlite_connections:
+                self._idle_sqlite_connections.append(connection)
+    
     def _create_tables(self):
         """Create database tables if they don't exist"""
         vendors_table_sql = """
@@ -92,6 +233,7 @@ class DatabaseManager:
         indexes_sql = [
             "CREATE INDEX IF NOT EXISTS idx_vendors_status ON vendors(status);",
             "CREATE INDEX IF NOT EXISTS idx_vendors_created_at ON vendors(created_at);",
+            "CREATE INDEX IF NOT EXISTS idx_vendors_created_at_id ON vendors(created_at, id);",
             "CREATE INDEX IF NOT EXISTS idx_vendors_name ON vendors(name);"
         ]
         
@@ -120,55 +262,41 @@ class DatabaseManager:
         finally:
             cursor.close()
     
+    def _vendor_insert_values(self, vendor_data: Dict[str, Any], now: str) -> tuple:
+        """Values for VENDOR_INSERT_COLUMNS, filling in defaults"""
+        get = vendor_data.get
+        return (
+            get('id'),
+            get('name'),
+            get('business_description'),
+            get('effective_date'),
+            get('renewal_date'),
+            get('reconciliation_summary'),
+            get('upload_date', now),
+            get('created_at', now),
+            now,  # updated_at
+            get('status', 'active'),
+            get('contract_filename'),
+            get('contract_content'),
+            get('contract_file_path'),
+            _json_dumps(get('metadata', {}))
+        )
+    
     def create_vendor(self, vendor_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new vendor in the database"""
         try:
             cursor = self.connection.cursor()
             
-            # Prepare the data
             vendor_id = vendor_data.get('id')
-            now = datetime.now().isoformat()
-            
-            insert_sql = """
-            INSERT INTO vendors (
-                id, name, business_description, effective_date, renewal_date,
-                reconciliation_summary, upload_date, created_at, updated_at,
-                status, contract_filename, contract_content, contract_file_path, metadata
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-            ) RETURNING *;
-            """ if self.use_postgres else """
-            INSERT INTO vendors (
-                id, name, business_description, effective_date, renewal_date,
-                reconciliation_summary, upload_date, created_at, updated_at,
-                status, contract_filename, contract_content, contract_file_path, metadata
-            ) VALUES (
-                ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
-            );
-            """
-            
-            values = (
-                vendor_id,
-                vendor_data.get('name'),
-                vendor_data.get('business_description'),
-                vendor_data.get('effective_date'),
-                vendor_data.get('renewal_date'),
-                vendor_data.get('reconciliation_summary'),
-                vendor_data.get('upload_date', now),
-                vendor_data.get('created_at', now),
-                now,  # updated_at
-                vendor_data.get('status', 'active'),
-                vendor_data.get('contract_filename'),
-                vendor_data.get('contract_content'),
-                vendor_data.get('contract_file_path'),
-                json.dumps(vendor_data.get('metadata', {}))
-            )
+            values = self._vendor_insert_values(vendor_data, datetime.now().isoformat())
             
-            cursor.execute(insert_sql, values)
+            cursor.execute(self.insert_vendor_sql, values)
             
-            if self.use_postgres:
+            if self.supports_returning:
                 result = cursor.fetchone()
-                vendor = dict(result) if result else vendor_data
+                if not self.use_postgres:
+                    self.connection.commit()
+                vendor = self._row_to_vendor(result) if result else vendor_data
             else:
                 self.connection.commit()
                 vendor = self.get_vendor(vendor_id)
@@ -182,24 +310,69 @@ class DatabaseManager:
         finally:
             cursor.close()
     
+    def create_vendors_bulk(self, vendors: List[Dict[str, Any]],
+                            skip_existing: bool = False) -> int:
+        """Create several vendors in a single transaction
+        
+        With skip_existing, vendors whose id is already present are left
+        untouched instead of failing the batch. Returns the number inserted.
+        """
+        if not vendors:
+            return 0
+        
+        now = datetime.now().isoformat()
+        rows = [self._vendor_insert_values(vendor_data, now) for vendor_data in vendors]
+        insert_sql = self.insert_vendors_sql
+        if skip_existing:
+            insert_sql += " ON CONFLICT (id) DO NOTHING"
+        
+        try:
+            cursor = self.connection.cursor()
+            
+            if self.use_postgres:
+                # One multi-row INSERT, so autocommit still applies it atomically
+                execute_values(cursor, insert_sql, rows, page_size=len(rows))
+            else:
+                cursor.executemany(insert_sql, rows)
+                self.connection.commit()
+            
+            created = cursor.rowcount if cursor.rowcount >= 0 else len(rows)
+            logger.info(f"Created {created} vendors")
+            return created
+            
+        except Exception as e:
+            if not self.use_postgres:
+                self.connection.rollback()
+            logger.error(f"Failed to create vendors: {e}")
+            raise
+        finally:
+            cursor.close()
+    
+    def _row_to_vendor(self, row, columns: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Convert a vendors row to a dict with parsed metadata
+        
+        Pass columns to build the dict from a plain tuple row.
+        """
+        vendor = dict(zip(columns, row)) if columns else dict(row)
+        metadata = vendor.get('metadata')
+        # SQLite stores JSON text; psycopg2 already decodes JSONB
+        if metadata and isinstance(metadata, (str, bytes)):
+            try:
+                vendor['metadata'] = _json_loads(metadata)
+            except:
+                vendor['metadata'] = {}
+        return vendor
+    
     def get_vendor(self, vendor_id: str) -> Optional[Dict[str, Any]]:
         """Get a vendor by ID"""
         try:
             cursor = self.connection.cursor()
             
-            select_sql = "SELECT * FROM vendors WHERE id = %s;" if self.use_postgres else "SELECT * FROM vendors WHERE id = ?;"
-            cursor.execute(select_sql, (vendor_id,))
+            cursor.execute(self.select_vendor_sql, (vendor_id,))
             
             result = cursor.fetchone()
             if result:
-                vendor = dict(result)
-                # Parse JSON metadata
-                if vendor.get('metadata'):
-                    try:
-                        vendor['metadata'] = json.loads(vendor['metadata'])
-                    except:
-                        vendor['metadata'] = {}
-                return vendor
+                return self._row_to_vendor(result)
             
             return None
             
@@ -209,27 +382,45 @@ class DatabaseManager:
         finally:
             cursor.close()
     
-    def get_all_vendors(self) -> List[Dict[str, Any]]:
-        """Get all vendors"""
+    def _vendor_page_query(self, limit: Optional[int], before_id: Optional[str]):
+        """Build a keyset page of the vendor list, newest first"""
+        p = self.placeholder
+        sql = f"SELECT {', '.join(VENDOR_LIST_COLUMNS)} FROM vendors"
+        params = []
+        if before_id:
+            # Resolve the cursor row's (created_at, id) in the database, so the
+            # full-precision timestamp never has to round-trip through JSON
+            sql += (f" WHERE (created_at, id) < "
+                    f"(SELECT created_at, id FROM vendors WHERE id = {p})")
+            params.append(before_id)
+        sql += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            sql += f" LIMIT {p}"
+            params.append(limit)
+        return sql + ";", params
+    
+    def get_all_vendors(self, limit: Optional[int] = None,
+                        before_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get vendors without their contract text, newest first
+        
+        Pass limit, and the id of the last vendor seen as before_id, to page
+        through the list; an unknown before_id yields an empty page.
+        """
+        paginated = limit is not None or before_id is not None
+        
         try:
             cursor = self.connection.cursor()
+            if not self.use_postgres:
+                cursor.row_factory = None  # plain tuples; columns are zipped in once
             
-            cursor.execute("SELECT * FROM vendors ORDER BY created_at DESC;")
-            
-            results = cursor.fetchall()
-            vendors = []
-            
-            for result in results:
-                vendor = dict(result)
-                # Parse JSON metadata
-                if vendor.get('metadata'):
-                    try:
-                        vendor['metadata'] = json.loads(vendor['metadata'])
-                    except:
-                        vendor['metadata'] = {}
-                vendors.append(vendor)
+            if paginated:
+                cursor.execute(*self._vendor_page_query(limit, before_id))
+            else:
+                cursor.execute(self.list_vendors_sql)
             
-            return vendors
+            # Convert rows as the cursor steps instead of buffering them all first
+            columns = None if self.use_postgres else [d[0] for d in cursor.description]
+            return [self._row_to_vendor(row, columns) for row in cursor]
             
         except Exception as e:
             logger.error(f"Failed to get vendors: {e}")
@@ -237,41 +428,43 @@ class DatabaseManager:
         finally:
             cursor.close()
     
+    def _update_vendor_sql(self, columns: tuple) -> str:
+        """UPDATE statement for a set of columns, built once per column tuple"""
+        update_sql = self._update_vendor_sql_cache.get(columns)
+        if update_sql is None:
+            p = self.placeholder
+            set_clauses = [f"{column} = {p}" for column in columns]
+            set_clauses.append(f"updated_at = {p}")
+            update_sql = f"UPDATE vendors SET {', '.join(set_clauses)} WHERE id = {p}"
+            if self.supports_returning:
+                update_sql += " RETURNING *"
+            if len(self._update_vendor_sql_cache) >= UPDATE_SQL_CACHE_SIZE:
+                self._update_vendor_sql_cache.clear()
+            self._update_vendor_sql_cache[columns] = update_sql
+        return update_sql
+    
     def update_vendor(self, vendor_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Update a vendor"""
         try:
             cursor = self.connection.cursor()
             
-            # Build dynamic update query
-            set_clauses = []
+            # Values in the same order as the cached statement's SET list
             values = []
-            
             for key, value in updates.items():
                 if key == 'metadata':
-                    value = json.dumps(value)
-                set_clauses.append(f"{key} = %s" if self.use_postgres else f"{key} = ?")
+                    value = _json_dumps(value)
                 values.append(value)
-            
-            # Add updated_at
-            set_clauses.append("updated_at = %s" if self.use_postgres else "updated_at = ?")
-            values.append(datetime.now().isoformat())
+            values.append(datetime.now().isoformat())  # updated_at
             values.append(vendor_id)
             
-            update_sql = f"""
-            UPDATE vendors 
-            SET {', '.join(set_clauses)}
-            WHERE id = %s
-            """ if self.use_postgres else f"""
-            UPDATE vendors 
-            SET {', '.join(set_clauses)}
-            WHERE id = ?
-            """
-            
-            cursor.execute(update_sql, values)
+            cursor.execute(self._update_vendor_sql(tuple(updates)), values)
+            result = cursor.fetchone() if self.supports_returning else None
             
             if not self.use_postgres:
                 self.connection.commit()
             
+            if self.supports_returning:
+                return self._row_to_vendor(result) if result else None
             return self.get_vendor(vendor_id)
             
         except Exception as e:
@@ -285,8 +478,7 @@ class DatabaseManager:
         try:
             cursor = self.connection.cursor()
             
-            delete_sql = "DELETE FROM vendors WHERE id = %s;" if self.use_postgres else "DELETE FROM vendors WHERE id = ?;"
-            cursor.execute(delete_sql, (vendor_id,))
+            cursor.execute(self.delete_vendor_sql, (vendor_id,))
             
             if not self.use_postgres:
                 self.connection.commit()
@@ -300,17 +492,25 @@ class DatabaseManager:
         finally:
             cursor.close()
     
+    def has_vendors(self) -> bool:
+        """Check whether any vendor exists without loading the table"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(self.has_vendors_sql)
+            return cursor.fetchone() is not None
+        finally:
+            cursor.close()
+    
     def get_health_stats(self) -> Dict[str, Any]:
         """Get database health and statistics"""
         try:
             cursor = self.connection.cursor()
             
-            # Get basic stats
-            cursor.execute("SELECT COUNT(*) as total_vendors FROM vendors;")
-            total_vendors = cursor.fetchone()[0] if not self.use_postgres else cursor.fetchone()['total_vendors']
-            
-            cursor.execute("SELECT COUNT(*) as active_vendors FROM vendors WHERE status = 'active';")
-            active_vendors = cursor.fetchone()[0] if not self.use_postgres else cursor.fetchone()['active_vendors']
+            # Get basic stats in one pass over the table
+            cursor.execute(VENDOR_STATS_SQL)
+            stats = cursor.fetchone()
+            total_vendors = stats['total_vendors']
+            active_vendors = stats['active_vendors'] or 0
             
             return {
                 "database_type": "PostgreSQL" if self.use_postgres else "SQLite",
@@ -332,9 +532,21 @@ class DatabaseManager:
             cursor.close()
     
     def close(self):
-        """Close database connection"""
-        if self.connection:
-            self.connection.close()
+        """Close database connections (every thread's, for SQLite)"""
+        if self.use_postgres:
+            connections = [self._postgres_connection] if self._postgres_connection else []
+            self._postgres_connection = None
+        else:
+            with self._sqlite_lock:
+                connections = self._sqlite_connections
+                self._sqlite_connections = []
+                self._idle_sqlite_connections = []
+                # Threads holding a closed connection open a new one on next use
+                self._local = threading.local()
+        
+        for connection in connections:
+            connection.close()
+        if connections:
             logger.info("Database connection closed")
 
 # Global database instance
@@ -352,9 +564,8 @@ def init_db():
     database = get_db()
     
     # Check if we already have data
-    vendors = database.get_all_vendors()
-    if len(vendors) > 0:
-        logger.info(f"Database already has {len(vendors)} vendors")
+    if database.has_vendors():
+        logger.info("Database already has vendors")
         return
     
     # Create demo vendors
@@ -381,11 +592,11 @@ def init_db():
         }
     ]
     
-    for vendor_data in demo_vendors:
-        try:
-            database.create_vendor(vendor_data)
-        except Exception as e:
-            logger.error(f"Failed to create demo vendor {vendor_data['id']}: {e}")
+    # Another worker may be seeding at the same moment; ids make this idempotent
+    try:
+        database.create_vendors_bulk(demo_vendors, skip_existing=True)
+    except Exception as e:
+        logger.error(f"Failed to create demo vendors: {e}")
     
     logger.info("Demo data initialized successfully")
 
@@ -8,7 +8,9 @@ import os
 import time
 import json
 import logging
+import threading
 import requests
+from collections import deque
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 from database import get_db
@@ -21,37 +23,39 @@ class HealthMonitor:
     """Comprehensive health monitoring for the platform"""
     
     def __init__(self):
-        self.start_time = datetime.now()
+        self.start_time = time.monotonic()
         self.metrics = {
             "requests": 0,
             "errors": 0,
-            "response_times": [],
+            # Keep only last 1000 response times for memory efficiency
+            "response_times": deque(maxlen=1000),
             "db_queries": 0,
             "db_errors": 0
         }
+        self._lock = threading.Lock()
         
     def record_request(self, response_time: float, status_code: int = 200):
         """Record a request with response time and status"""
-        self.metrics["requests"] += 1
-        self.metrics["response_times"].append(response_time)
-        
-        if status_code >= 400:
-            self.metrics["errors"] += 1
-        
-        # Keep only last 1000 response times for memory efficiency
-        if len(self.metrics["response_times"]) > 1000:
-            self.metrics["response_times"] = self.metrics["response_times"][-1000:]
+        with self._lock:
+            self.metrics["requests"] += 1
+            self.metrics["response_times"].append(response_time)
+            
+            if status_code >= 400:
+                self.metrics["errors"] += 1
     
     def record_db_query(self, success: bool = True):
         """Record database query statistics"""
-        self.metrics["db_queries"] += 1
-        if not success:
-            self.metrics["db_errors"] += 1
+        with self._lock:
+            self.metrics["db_queries"] += 1
+            if not success:
+                self.metrics["db_errors"] += 1
     
     def get_health_report(self) -> Dict[str, Any]:
         """Generate comprehensive health report"""
-        uptime = datetime.now() - self.start_time
-        response_times = self.metrics["response_times"]
+        uptime = timedelta(seconds=time.monotonic() - self.start_time)
+        with self._lock:
+            # Snapshot: a deque raises if appended to while being summed
+            response_times = list(self.metrics["response_times"])
         
         # Calculate statistics
         avg_response_time = sum(response_times) / len(response_times) if response_times else 0
@@ -97,12 +101,12 @@ class HealthMonitor:
     def check_database_health(self) -> Dict[str, Any]:
         """Perform detailed database health check"""
         try:
-            start_time = time.time()
+            start_time = time.perf_counter()
             database = get_db()
             
             # Test basic connectivity
             stats = database.get_health_stats()
-            query_time = (time.time() - start_time) * 1000  # Convert to ms
+            query_time = (time.perf_counter() - start_time) * 1000  # Convert to ms
             
             self.record_db_query(success=True)
             
@@ -166,34 +170,39 @@ class PerformanceProfiler:
     
     def __init__(self):
         self.endpoint_stats = {}
+        self._lock = threading.Lock()
     
     def record_endpoint(self, endpoint: str, method: str, response_time: float, status_code: int):
         """Record endpoint performance statistics"""
         key = f"{method} {endpoint}"
         
-        if key not in self.endpoint_stats:
-            self.endpoint_stats[key] = {
-                "calls": 0,
-                "total_time": 0,
-                "errors": 0,
-                "min_time": float('inf'),
-                "max_time": 0
-            }
-        
-        stats = self.endpoint_stats[key]
-        stats["calls"] += 1
-        stats["total_time"] += response_time
-        stats["min_time"] = min(stats["min_time"], response_time)
-        stats["max_time"] = max(stats["max_time"], response_time)
-        
-        if status_code >= 400:
-            stats["errors"] += 1
+        with self._lock:
+            if key not in self.endpoint_stats:
+                self.endpoint_stats[key] = {
+                    "calls": 0,
+                    "total_time": 0,
+                    "errors": 0,
+                    "min_time": float('inf'),
+                    "max_time": 0
+                }
+            
+            stats = self.endpoint_stats[key]
+            stats["calls"] += 1
+            stats["total_time"] += response_time
+            stats["min_time"] = min(stats["min_time"], response_time)
+            stats["max_time"] = max(stats["max_time"], response_time)
+            
+            if status_code >= 400:
+                stats["errors"] += 1
     
     def get_endpoint_report(self) -> Dict[str, Any]:
         """Get performance report for all endpoints"""
         report = {}
         
-        for endpoint, stats in self.endpoint_stats.items():
+        with self._lock:
+            snapshot = [(endpoint, dict(stats)) for endpoint, stats in self.endpoint_stats.items()]
+        
+        for endpoint, stats in snapshot:
             avg_time = stats["total_time"] / stats["calls"] if stats["calls"] > 0 else 0
             error_rate = (stats["errors"] / stats["calls"]) * 100 if stats["calls"] > 0 else 0
             
@@ -222,7 +231,7 @@ def create_monitoring_middleware(app):
     def before_request():
         """Record request start time"""
         import flask
-        flask.g.start_time = time.time()
+        flask.g.start_time = time.perf_counter()
     
     @app.after_request
     def after_request(response):
@@ -230,7 +239,7 @@ def create_monitoring_middleware(app):
         import flask
         
         if hasattr(flask.g, 'start_time'):
-            response_time = (time.time() - flask.g.start_time) * 1000  # Convert to ms
+            response_time = (time.perf_counter() - flask.g.start_time) * 1000  # Convert to ms
             
             # Record in monitor
             monitor.record_request(response_time, response.status_code)